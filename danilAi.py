@@ -1,5 +1,13 @@
 import sys
+import os
 import asyncio
+import cProfile
+import pstats
+import tracemalloc
+import traceback
+import hashlib
+import json
+import time
 import threading
 import requests
 import re
@@ -9,6 +17,7 @@ import sqlite3
 from PyQt6.QtWidgets import *
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
+from PyQt6 import sip
 
 # ==================== DATABASE ====================
 class ChatDatabase:
@@ -41,6 +50,12 @@ class ChatDatabase:
                 value TEXT NOT NULL
             )
         ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS chunk_cache (
+                hash TEXT PRIMARY KEY,
+                summary TEXT NOT NULL
+            )
+        ''')
         conn.commit()
         conn.close()
     
@@ -112,9 +127,39 @@ class ChatDatabase:
         result = cursor.fetchone()
         conn.close()
         return result[0] if result else ""
+    
+    def get_chunk_summary(self, chunk_hash):
+        """Возвращает сохраненный результат обработки фрагмента документа или None"""
+        conn = sqlite3.connect("chat_history.db")
+        cursor = conn.cursor()
+        cursor.execute("SELECT summary FROM chunk_cache WHERE hash = ?", (chunk_hash,))
+        result = cursor.fetchone()
+        conn.close()
+        return result[0] if result else None
+    
+    def save_chunk_summary(self, chunk_hash, summary):
+        conn = sqlite3.connect("chat_history.db")
+        cursor = conn.cursor()
+        cursor.execute("INSERT OR REPLACE INTO chunk_cache (hash, summary) VALUES (?, ?)", (chunk_hash, summary))
+        conn.commit()
+        conn.close()
 
 # ==================== AI ENGINE ====================
+class AIEngineError(Exception):
+    """Ошибка бэкенда; текст сообщения можно показывать пользователю"""
+    pass
+
 class AIEngine:
+    # Сколько запросов можно одновременно отправлять каждому бэкенду
+    LOCAL_MAX_CONCURRENCY = 2
+    OPENAI_MAX_CONCURRENCY = 4
+    # Модели для выбора в интерфейсе: название -> (бэкенд, модель)
+    MODELS = {
+        "Локальная (Llama 2)": ("local", "llama2"),
+        "GPT-3.5 Turbo": ("openai", "gpt-3.5-turbo"),
+        "GPT-4": ("openai", "gpt-4"),
+    }
+    
     def __init__(self):
         self.api_key = ""
         self.system_prompt = "Ты - полезный AI ассистент Danil. Отвечай на русском языке."
@@ -133,40 +178,394 @@ class AIEngine:
         
         return False
     
+    def uses_openai(self):
+        return bool(self.api_key) and self.validate_api_key(self.api_key)
+    
+    def backend_name(self):
+        """Имя текущего бэкенда и модели, например 'local:llama2'"""
+        return "openai:gpt-3.5-turbo" if self.uses_openai() else "local:llama2"
+    
+    def max_concurrency(self):
+        return self.OPENAI_MAX_CONCURRENCY if self.uses_openai() else self.LOCAL_MAX_CONCURRENCY
+    
     async def generate_response(self, messages):
         try:
-            if self.api_key and self.validate_api_key(self.api_key):
-                return await self._generate_openai(messages)
-            else:
-                return await self._generate_local(messages)
+            return await self.complete(messages)
+        except AIEngineError as e:
+            return str(e)
         except Exception as e:
             return f"Ошибка: {str(e)}"
     
-    async def _generate_local(self, messages):
+    async def complete(self, messages):
+        """Возвращает ответ модели, при ошибке бросает AIEngineError.
+        
+        HTTP-запрос выполняется в пуле потоков, поэтому несколько вызовов
+        в одном event loop действительно идут параллельно.
+        """
+        loop = asyncio.get_running_loop()
+        if self.uses_openai():
+            return await loop.run_in_executor(None, self._request_openai, messages)
+        return await loop.run_in_executor(None, self._request_local, messages)
+    
+    def _request_local(self, messages):
         try:
             response = requests.post(
                 "http://localhost:11434/api/chat",
                 json={"model": "llama2", "messages": messages, "stream": False},
                 timeout=120
             )
-            if response.status_code == 200:
-                return response.json()["message"]["content"]
-            return "Локальная модель не запущена. Установите Ollama."
-        except:
-            return "Ошибка подключения к локальной модели."
+        except requests.RequestException:
+            raise AIEngineError("Ошибка подключения к локальной модели.")
+        if response.status_code == 200:
+            return response.json()["message"]["content"]
+        raise AIEngineError("Локальная модель не запущена. Установите Ollama.")
     
-    async def _generate_openai(self, messages):
+    def _request_openai(self, messages):
         try:
             headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
             data = {"model": "gpt-3.5-turbo", "messages": messages, "temperature": 0.7}
             response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=data, timeout=60)
-            if response.status_code == 200:
-                return response.json()["choices"][0]["message"]["content"]
-            elif response.status_code == 401:
-                return "Ошибка: Неверный API ключ. Проверьте ключ в настройках."
-            return "Ошибка API OpenAI."
-        except:
-            return "Ошибка подключения к OpenAI."
+        except requests.RequestException:
+            raise AIEngineError("Ошибка подключения к OpenAI.")
+        if response.status_code == 200:
+            return response.json()["choices"][0]["message"]["content"]
+        elif response.status_code == 401:
+            raise AIEngineError("Ошибка: Неверный API ключ. Проверьте ключ в настройках.")
+        raise AIEngineError("Ошибка API OpenAI.")
+    
+    def stream_response(self, messages, model_name):
+        """Генератор фрагментов ответа выбранной модели из MODELS.
+        
+        Блокирующий, вызывается из рабочего потока. Каждый фрагмент потока
+        обычно соответствует одному токену. При ошибке бросает AIEngineError.
+        """
+        backend, model = self.MODELS[model_name]
+        if backend == "openai":
+            if not self.uses_openai():
+                raise AIEngineError("Ошибка: Укажите API ключ OpenAI в настройках.")
+            yield from self._stream_openai(messages, model)
+        else:
+            yield from self._stream_local(messages, model)
+    
+    def _stream_local(self, messages, model):
+        try:
+            response = requests.post(
+                "http://localhost:11434/api/chat",
+                json={"model": model, "messages": messages, "stream": True},
+                stream=True,
+                timeout=120
+            )
+            with response:
+                if response.status_code != 200:
+                    raise AIEngineError("Локальная модель не запущена. Установите Ollama.")
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if "error" in data:
+                        raise AIEngineError(f"Ошибка локальной модели: {data['error']}")
+                    content = data.get("message", {}).get("content", "")
+                    if content:
+                        yield content
+        except requests.RequestException:
+            raise AIEngineError("Ошибка подключения к локальной модели.")
+    
+    def _stream_openai(self, messages, model):
+        try:
+            headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+            data = {"model": model, "messages": messages, "temperature": 0.7, "stream": True}
+            response = requests.post(
+                "https://api.openai.com/v1/chat/completions",
+                headers=headers, json=data, stream=True, timeout=60
+            )
+            with response:
+                if response.status_code == 401:
+                    raise AIEngineError("Ошибка: Неверный API ключ. Проверьте ключ в настройках.")
+                if response.status_code != 200:
+                    raise AIEngineError("Ошибка API OpenAI.")
+                for line in response.iter_lines():
+                    # Server-sent events: "data: {...}", поток завершается "data: [DONE]"
+                    if not line.startswith(b"data: "):
+                        continue
+                    payload = line[len(b"data: "):]
+                    if payload == b"[DONE]":
+                        break
+                    choices = json.loads(payload).get("choices") or [{}]
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+        except requests.RequestException:
+            raise AIEngineError("Ошибка подключения к OpenAI.")
+
+# ==================== DOCUMENTS ====================
+class DocumentProcessor:
+    """Обработка больших документов по схеме map-reduce.
+    
+    Файл читается блоками и режется на фрагменты, каждый фрагмент кратко
+    излагается отдельным запросом (не больше ai.max_concurrency() запросов
+    одновременно), затем изложения сводятся в итоговый ответ. Результаты
+    по фрагментам кэшируются в базе по хэшу, поэтому повторный запуск
+    пропускает уже обработанные фрагменты.
+    """
+    CHUNK_CHARS = 6000
+    MAP_PROMPT = "Кратко изложи ключевые факты и мысли этого фрагмента документа:"
+    REDUCE_PROMPT = "Объедини эти краткие изложения частей документа в одно, сохранив ключевые факты:"
+    FINAL_PROMPT = "Ниже краткие изложения частей документа «%s»."
+    DEFAULT_QUESTION = "Составь итоговое краткое изложение документа."
+    
+    def __init__(self, ai, db):
+        self.ai = ai
+        self.db = db
+    
+    def iter_chunks(self, path):
+        """Читает файл блоками и отдает фрагменты не длиннее CHUNK_CHARS.
+        
+        Фрагменты по возможности заканчиваются на переводе строки.
+        В памяти одновременно держится не больше двух блоков.
+        """
+        buffer = ""
+        with open(path, encoding="utf-8", errors="replace") as f:
+            while True:
+                block = f.read(self.CHUNK_CHARS)
+                if not block:
+                    break
+                buffer += block
+                while len(buffer) >= self.CHUNK_CHARS:
+                    cut = buffer.rfind("\n", 0, self.CHUNK_CHARS) + 1
+                    if cut <= 0:
+                        cut = self.CHUNK_CHARS
+                    yield buffer[:cut]
+                    buffer = buffer[cut:]
+        if buffer:
+            yield buffer
+    
+    def chunk_hash(self, chunk):
+        key = "\n".join([self.ai.backend_name(), self.MAP_PROMPT, chunk])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+    
+    async def ask(self, instruction, text):
+        messages = [
+            {"role": "system", "content": self.ai.system_prompt},
+            {"role": "user", "content": f"{instruction}\n\n{text}"}
+        ]
+        return await self.ai.complete(messages)
+    
+    async def summarize(self, path, question="", on_progress=None):
+        """Возвращает ответ на вопрос по документу (или его краткое изложение)"""
+        progress = on_progress or (lambda status: None)
+        limit = self.ai.max_concurrency()
+        summaries = {}
+        pending = {}
+        read = cached = 0
+        
+        async def map_chunk(chunk, chunk_hash):
+            summary = await self.ask(self.MAP_PROMPT, chunk)
+            self.db.save_chunk_summary(chunk_hash, summary)
+            return summary
+        
+        def report():
+            progress(f"Обработка документа: готово {len(summaries)} из {read} фрагментов (из кэша: {cached})")
+        
+        async def collect(return_when):
+            done, _ = await asyncio.wait(pending, return_when=return_when)
+            for task in done:
+                summaries[pending.pop(task)] = task.result()
+            report()
+        
+        try:
+            for chunk in self.iter_chunks(path):
+                if not chunk.strip():
+                    continue
+                index = read
+                read += 1
+                chunk_hash = self.chunk_hash(chunk)
+                summary = self.db.get_chunk_summary(chunk_hash)
+                if summary is not None:
+                    summaries[index] = summary
+                    cached += 1
+                    report()
+                    continue
+                # Не читаем файл дальше, пока все слоты бэкенда заняты
+                while len(pending) >= limit:
+                    await collect(asyncio.FIRST_COMPLETED)
+                pending[asyncio.ensure_future(map_chunk(chunk, chunk_hash))] = index
+            while pending:
+                await collect(asyncio.FIRST_COMPLETED)
+        finally:
+            # При ошибке даем уже отправленным фрагментам завершиться,
+            # чтобы их результаты попали в кэш для повторного запуска
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        if not summaries:
+            raise AIEngineError("Документ пуст.")
+        
+        parts = [summaries[i] for i in sorted(summaries)]
+        while len(parts) > 1 and len("\n\n".join(parts)) > self.CHUNK_CHARS:
+            groups = self._group(parts)
+            progress(f"Объединение частичных результатов: {len(parts)} → {len(groups)}")
+            parts = await self._gather_limited(self.REDUCE_PROMPT, ["\n\n".join(g) for g in groups])
+        
+        progress("Формирование итогового ответа...")
+        instruction = self.FINAL_PROMPT % os.path.basename(path) + " " + (question or self.DEFAULT_QUESTION)
+        return await self.ask(instruction, "\n\n".join(parts))
+    
+    def _group(self, parts):
+        """Разбивает изложения на группы не длиннее CHUNK_CHARS, минимум по две"""
+        groups = [[]]
+        size = 0
+        for part in parts:
+            if len(groups[-1]) >= 2 and size + len(part) > self.CHUNK_CHARS:
+                groups.append([])
+                size = 0
+            groups[-1].append(part)
+            size += len(part)
+        if len(groups) > 1 and len(groups[-1]) == 1:
+            groups[-2].extend(groups.pop())
+        return groups
+    
+    async def _gather_limited(self, instruction, texts):
+        semaphore = asyncio.Semaphore(self.ai.max_concurrency())
+        
+        async def run(text):
+            async with semaphore:
+                return await self.ask(instruction, text)
+        
+        # Дожидаемся всех запросов, даже если какой-то из них упал
+        results = await asyncio.gather(*(run(text) for text in texts), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+# ==================== DIAGNOSTICS ====================
+REPORTS_DIR = "reports"
+
+def report_path(prefix, extension):
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return os.path.join(REPORTS_DIR, f"{prefix}-{stamp}.{extension}")
+
+class StallWatchdog:
+    """Обнаруживает зависания главного потока Qt.
+    
+    Таймер в главном потоке обновляет отметку времени, а отдельный поток
+    проверяет, как давно она обновлялась. Если дольше порога, в REPORTS_DIR
+    записывается стек главного потока в этот момент. Когда главный поток
+    оживает, в тот же отчет дописывается длительность зависания. Все
+    обращения к файлам выполняет поток наблюдения.
+    """
+    DEFAULT_THRESHOLD_MS = 500
+    HEARTBEAT_MS = 100
+    # Порог ниже двух интервалов сигнала срабатывал бы на простаивающем приложении
+    MIN_THRESHOLD_MS = 2 * HEARTBEAT_MS
+    
+    def __init__(self, threshold_ms=DEFAULT_THRESHOLD_MS):
+        self.threshold = max(threshold_ms, self.MIN_THRESHOLD_MS) / 1000
+        self.main_thread_id = threading.main_thread().ident
+        self.last_beat = time.monotonic()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.beat)
+        self.timer.start(self.HEARTBEAT_MS)
+        threading.Thread(target=self.watch, daemon=True).start()
+    
+    def beat(self):
+        with self.lock:
+            self.last_beat = time.monotonic()
+    
+    def watch(self):
+        report = None
+        stall_start = None  # Последний сигнал перед текущим зависанием
+        while not self.stopped.wait(self.threshold / 4):
+            with self.lock:
+                last_beat = self.last_beat
+            if stall_start is None:
+                elapsed = time.monotonic() - last_beat
+                if elapsed > self.threshold:
+                    stall_start = last_beat
+                    try:
+                        report = self.write_report(elapsed)
+                    except OSError as e:
+                        print(f"Не удалось записать отчет о зависании: {e}", file=sys.stderr)
+            elif last_beat > stall_start:
+                # Первый сигнал после зависания, даже если он пришел
+                # еще во время записи отчета
+                if report:
+                    try:
+                        with open(report, "a", encoding="utf-8") as f:
+                            f.write(f"\nЗависание длилось: {last_beat - stall_start:.2f} с\n")
+                    except OSError as e:
+                        print(f"Не удалось дополнить отчет о зависании: {e}", file=sys.stderr)
+                report = stall_start = None
+    
+    def write_report(self, elapsed):
+        frame = sys._current_frames().get(self.main_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame else "Стек недоступен\n"
+        path = report_path("stall", "txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Зависание главного потока: {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+            f.write(f"Порог: {self.threshold * 1000:.0f} мс, без ответа: {elapsed * 1000:.0f} мс\n\n")
+            f.write("Стек главного потока:\n")
+            f.write(stack)
+        return path
+    
+    def stop(self):
+        self.stopped.set()
+        self.timer.stop()
+
+class Profiler:
+    """cProfile и tracemalloc по требованию.
+    
+    cProfile учитывает только поток, в котором вызван start(), поэтому
+    запускать нужно из главного потока. stop() записывает в REPORTS_DIR
+    файл .prof (для pstats/snakeviz) и текстовый отчет.
+    """
+    STATS_LIMIT = 50
+    MEMORY_LIMIT = 30
+    
+    def __init__(self):
+        self.profile = None
+        self.owns_tracemalloc = False  # Трассировку памяти включили мы, а не PYTHONTRACEMALLOC и т.п.
+    
+    @property
+    def active(self):
+        return self.profile is not None
+    
+    def start(self):
+        if self.active:
+            return
+        self.profile = cProfile.Profile()
+        self.owns_tracemalloc = not tracemalloc.is_tracing()
+        if self.owns_tracemalloc:
+            tracemalloc.start(10)
+        self.profile.enable()
+    
+    def stop(self):
+        """Останавливает профилирование и возвращает путь к текстовому отчету"""
+        if not self.active:
+            return None
+        self.profile.disable()
+        profile, self.profile = self.profile, None
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.owns_tracemalloc:
+            tracemalloc.stop()
+            self.owns_tracemalloc = False
+        
+        path = report_path("profile", "txt")
+        profile.dump_stats(path[:-len(".txt")] + ".prof")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Профиль: {datetime.now():%Y-%m-%d %H:%M:%S}\n\n")
+            stats = pstats.Stats(profile, stream=f)
+            stats.sort_stats("cumulative").print_stats(self.STATS_LIMIT)
+            f.write(f"\nПамять: текущая {current / 1024:.1f} КБ, пик {peak / 1024:.1f} КБ\n")
+            f.write(f"Крупнейшие выделения памяти (топ {self.MEMORY_LIMIT}):\n")
+            for stat in snapshot.statistics("lineno")[:self.MEMORY_LIMIT]:
+                f.write(f"{stat}\n")
+        return path
 
 # ==================== MAIN WINDOW ====================
 class AIAssistant(QMainWindow):
@@ -180,6 +579,19 @@ class AIAssistant(QMainWindow):
         self.current_conversation_id = None
         self.conversations = {}  # Кэш сообщений по ID диалога
         
+        # Диагностика: DANIL_STALL_MS - порог зависания (0 - выключить),
+        # DANIL_PROFILE=1 - профилировать с запуска до закрытия окна
+        self.profiler = Profiler()
+        if os.environ.get("DANIL_PROFILE") == "1":
+            self.profiler.start()
+        self.watchdog = None
+        try:
+            stall_ms = int(os.environ.get("DANIL_STALL_MS", StallWatchdog.DEFAULT_THRESHOLD_MS))
+        except ValueError:
+            stall_ms = StallWatchdog.DEFAULT_THRESHOLD_MS
+        if stall_ms > 0:
+            self.watchdog = StallWatchdog(stall_ms)
+        
         self.init_ui()
         self.load_conversations()
         
@@ -277,7 +689,7 @@ class AIAssistant(QMainWindow):
         model_label.setStyleSheet("color: #495057; font-weight: 500;")
         
         self.model_combo = QComboBox()
-        self.model_combo.addItems(["Локальная (Llama 2)", "GPT-3.5 Turbo", "GPT-4"])
+        self.model_combo.addItems(list(AIEngine.MODELS))
         self.model_combo.setStyleSheet("""
             QComboBox {
                 background: white; border: 1px solid #ced4da; border-radius: 6px;
@@ -295,9 +707,36 @@ class AIAssistant(QMainWindow):
         """)
         clear_btn.clicked.connect(self.clear_screen)
         
+        compare_btn = QPushButton("Сравнить модели")
+        compare_btn.setToolTip("Отправить сообщение нескольким моделям одновременно")
+        compare_btn.setStyleSheet("""
+            QPushButton {
+                background: white; color: #495057; border: 1px solid #ced4da;
+                border-radius: 6px; padding: 8px 16px; font-weight: 500;
+            }
+            QPushButton:hover { background: #f8f9fa; }
+        """)
+        compare_btn.clicked.connect(self.compare_models)
+        
+        self.profile_btn = QPushButton("Профилирование")
+        self.profile_btn.setCheckable(True)
+        self.profile_btn.setChecked(self.profiler.active)
+        self.profile_btn.setToolTip("cProfile и tracemalloc главного потока; отчет сохраняется в папку reports (Ctrl+Shift+P)")
+        self.profile_btn.setStyleSheet("""
+            QPushButton {
+                background: white; color: #495057; border: 1px solid #ced4da;
+                border-radius: 6px; padding: 8px 16px; font-weight: 500;
+            }
+            QPushButton:hover { background: #f8f9fa; }
+            QPushButton:checked { background: #f8d7da; color: #dc3545; border: 1px solid #dc3545; }
+        """)
+        self.profile_btn.clicked.connect(self.toggle_profiler)
+        
         toolbar_layout.addWidget(model_label)
         toolbar_layout.addWidget(self.model_combo)
+        toolbar_layout.addWidget(compare_btn)
         toolbar_layout.addStretch()
+        toolbar_layout.addWidget(self.profile_btn)
         toolbar_layout.addWidget(clear_btn)
         
         # Chat area
@@ -333,6 +772,18 @@ class AIAssistant(QMainWindow):
         
         send_panel = QHBoxLayout()
         
+        self.document_btn = QPushButton("Документ")
+        self.document_btn.setFixedHeight(45)
+        self.document_btn.setToolTip("Отправить файл; текст в поле ввода будет вопросом к документу")
+        self.document_btn.setStyleSheet("""
+            QPushButton {
+                background: white; color: #495057; border: 1px solid #ced4da;
+                border-radius: 8px; padding: 0 16px; font-weight: 500; font-size: 14px;
+            }
+            QPushButton:hover { background: #f8f9fa; }
+        """)
+        self.document_btn.clicked.connect(self.send_document)
+        
         self.send_btn = QPushButton("Отправить")
         self.send_btn.setFixedHeight(45)
         self.send_btn.setMinimumWidth(120)
@@ -346,6 +797,7 @@ class AIAssistant(QMainWindow):
         self.send_btn.clicked.connect(self.send_message)
         
         send_panel.addStretch()
+        send_panel.addWidget(self.document_btn)
         send_panel.addWidget(self.send_btn)
         
         input_layout.addWidget(self.input_field, 1)
@@ -361,6 +813,7 @@ class AIAssistant(QMainWindow):
         # Shortcuts
         QShortcut(QKeySequence("Ctrl+Return"), self).activated.connect(self.send_message)
         QShortcut(QKeySequence("Ctrl+N"), self).activated.connect(self.new_conversation)
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self).activated.connect(self.profile_btn.click)
         
         # Load API key
         self.ai.api_key = self.db.get_setting("api_key")
@@ -478,6 +931,13 @@ class AIAssistant(QMainWindow):
         self.input_field.clear()
         
         # Показываем индикатор загрузки
+        loading_widget, _ = self.add_loading_message("Генерация ответа...")
+        
+        # Генерируем ответ
+        threading.Thread(target=self.generate_response, args=(text, loading_widget), daemon=True).start()
+    
+    def add_loading_message(self, status):
+        """Добавляет в чат индикатор загрузки, возвращает виджет и метку статуса"""
         loading_widget = QWidget()
         loading_widget.setFixedHeight(60)
         loading_layout = QHBoxLayout(loading_widget)
@@ -494,7 +954,7 @@ class AIAssistant(QMainWindow):
         name = QLabel("Danil AI")
         name.setStyleSheet("color: #444; font-weight: bold;")
         
-        loading_text = QLabel("Генерация ответа...")
+        loading_text = QLabel(status)
         
         frame_layout.addWidget(name)
         frame_layout.addWidget(loading_text)
@@ -504,17 +964,101 @@ class AIAssistant(QMainWindow):
         
         self.chat_layout.insertWidget(self.chat_layout.count() - 1, loading_widget)
         self.scroll_to_bottom()
+        return loading_widget, loading_text
+    
+    def send_document(self):
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Выберите документ", "",
+            "Текстовые файлы (*.txt *.md *.csv *.json *.log);;Все файлы (*)"
+        )
+        if not path:
+            return
         
-        # Генерируем ответ
-        threading.Thread(target=self.generate_response, args=(text, loading_widget), daemon=True).start()
+        question = self.input_field.toPlainText().strip()
+        text = f"📄 {os.path.basename(path)}"
+        if question:
+            text += f"\n{question}"
+        
+        self.add_message(text, True)
+        self.db.save_message(self.current_conversation_id, "user", text)
+        if self.current_conversation_id not in self.conversations:
+            self.conversations[self.current_conversation_id] = []
+        self.conversations[self.current_conversation_id].append({"role": "user", "content": text})
+        
+        self.input_field.clear()
+        
+        loading_widget, loading_text = self.add_loading_message("Чтение документа...")
+        # Индикатор удаляется при переключении или очистке диалога,
+        # после этого обработка продолжается, но прогресс больше не шлется
+        widget_destroyed = threading.Event()
+        loading_widget.destroyed.connect(lambda *_: widget_destroyed.set())
+        threading.Thread(
+            target=self.process_document,
+            args=(path, question, self.current_conversation_id, loading_widget, loading_text, widget_destroyed),
+            daemon=True
+        ).start()
     
-    def generate_response(self, user_message, loading_widget):
-        # Получаем историю сообщений для текущего диалога из кэша
+    def process_document(self, path, question, conv_id, loading_widget, loading_text, widget_destroyed):
+        def on_progress(status):
+            if widget_destroyed.is_set():
+                return
+            QMetaObject.invokeMethod(self, "update_progress",
+                Qt.ConnectionType.QueuedConnection,
+                Q_ARG(str, status),
+                Q_ARG(object, loading_text))
+        
+        processor = DocumentProcessor(self.ai, self.db)
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            response = loop.run_until_complete(processor.summarize(path, question, on_progress))
+        except AIEngineError as e:
+            response = str(e)
+        except OSError as e:
+            response = f"Ошибка чтения документа: {str(e)}"
+        except Exception as e:
+            response = f"Ошибка: {str(e)}"
+        finally:
+            loop.close()
+        
+        QMetaObject.invokeMethod(self, "finish_document",
+            Qt.ConnectionType.QueuedConnection,
+            Q_ARG(str, response),
+            Q_ARG(object, loading_widget),
+            Q_ARG(object, conv_id))
+    
+    @pyqtSlot(str, object)
+    def update_progress(self, status, loading_text):
+        if not sip.isdeleted(loading_text):
+            loading_text.setText(status)
+    
+    @pyqtSlot(str, object, object)
+    def finish_document(self, response, loading_widget, conv_id):
+        """Сохраняет ответ в диалог, из которого был отправлен документ"""
+        if not sip.isdeleted(loading_widget):
+            loading_widget.deleteLater()
+        # Диалог могли удалить, пока документ обрабатывался
+        if conv_id not in [c[0] for c in self.db.get_all_conversations()]:
+            return
+        self.db.save_message(conv_id, "assistant", response)
+        # Если диалога нет в кэше, он загрузится из базы при переключении
+        if conv_id in self.conversations:
+            self.conversations[conv_id].append({"role": "assistant", "content": response})
+        if conv_id == self.current_conversation_id:
+            self.add_message(response, False)
+    
+    def get_history_messages(self):
+        """История сообщений текущего диалога из кэша в формате API"""
         messages = []
         if self.current_conversation_id in self.conversations:
             for msg in self.conversations[self.current_conversation_id]:
                 if msg["role"] == "assistant" or msg["role"] == "user":
                     messages.append({"role": msg["role"], "content": msg["content"]})
+        return messages
+    
+    def generate_response(self, user_message, loading_widget):
+        # Получаем историю сообщений для текущего диалога из кэша
+        messages = self.get_history_messages()
         
         # Добавляем текущее сообщение пользователя
         messages.append({"role": "user", "content": user_message})
@@ -539,6 +1083,111 @@ class AIAssistant(QMainWindow):
             self.conversations[self.current_conversation_id] = []
         self.conversations[self.current_conversation_id].append({"role": "assistant", "content": response})
     
+    def compare_models(self):
+        text = self.input_field.toPlainText().strip()
+        if not text:
+            QMessageBox.information(self, "Сравнение моделей", "Введите сообщение для сравнения.")
+            return
+        
+        dialog = CompareDialog(self)
+        if not dialog.exec() or not dialog.selected_models:
+            return
+        
+        self.add_message(text, True)
+        self.db.save_message(self.current_conversation_id, "user", text)
+        if self.current_conversation_id not in self.conversations:
+            self.conversations[self.current_conversation_id] = []
+        self.conversations[self.current_conversation_id].append({"role": "user", "content": text})
+        
+        self.input_field.clear()
+        
+        # Все модели получают одинаковый контекст
+        messages = self.get_history_messages()
+        
+        compare_widget = QWidget()
+        compare_layout = QHBoxLayout(compare_widget)
+        compare_layout.setContentsMargins(20, 15, 20, 15)
+        compare_layout.setSpacing(10)
+        
+        # Потоки останавливаются, когда ответ выбран или таблица удалена
+        # (переключение, создание или очистка диалога)
+        stopped = threading.Event()
+        compare_widget.destroyed.connect(lambda *_: stopped.set())
+        
+        for model_name in dialog.selected_models:
+            column = CompareColumn(model_name)
+            column.keep_btn.clicked.connect(
+                lambda _, c=column: self.keep_compare_reply(compare_widget, c, stopped))
+            compare_layout.addWidget(column, 1)
+            threading.Thread(target=self.stream_compare, args=(model_name, messages, column, stopped), daemon=True).start()
+        
+        self.chat_layout.insertWidget(self.chat_layout.count() - 1, compare_widget)
+        self.scroll_to_bottom()
+    
+    def stream_compare(self, model_name, messages, column, stopped):
+        start = time.perf_counter()
+        first_token = None
+        tokens = 0
+        error = ""
+        stream = self.ai.stream_response(messages, model_name)
+        try:
+            for delta in stream:
+                if stopped.is_set():
+                    return
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                tokens += 1
+                QMetaObject.invokeMethod(self, "update_compare",
+                    Qt.ConnectionType.QueuedConnection,
+                    Q_ARG(object, column),
+                    Q_ARG(str, delta))
+        except AIEngineError as e:
+            error = str(e)
+        except Exception as e:
+            error = f"Ошибка: {str(e)}"
+        finally:
+            # Закрывает HTTP-соединение, если поток прерван досрочно
+            stream.close()
+        total = time.perf_counter() - start
+        
+        if first_token is None:
+            stats = f"Всего: {total:.2f} с"
+        else:
+            # Скорость считаем по фазе генерации: первый токен пришел в момент
+            # first_token, за оставшееся время пришли остальные tokens - 1
+            generation = total - first_token
+            if tokens > 1 and generation > 0:
+                speed = (tokens - 1) / generation
+            else:
+                speed = tokens / total if total > 0 else 0.0
+            stats = f"Первый токен: {first_token:.2f} с · Всего: {total:.2f} с · {speed:.1f} ток/с"
+        
+        QMetaObject.invokeMethod(self, "finish_compare",
+            Qt.ConnectionType.QueuedConnection,
+            Q_ARG(object, column),
+            Q_ARG(str, stats),
+            Q_ARG(str, error))
+    
+    @pyqtSlot(object, str)
+    def update_compare(self, column, delta):
+        if not sip.isdeleted(column):
+            column.append_text(delta)
+    
+    @pyqtSlot(object, str, str)
+    def finish_compare(self, column, stats, error):
+        if not sip.isdeleted(column):
+            column.finish(stats, error)
+    
+    def keep_compare_reply(self, compare_widget, column, stopped):
+        """Оставляет выбранный ответ в истории вместо таблицы сравнения"""
+        stopped.set()
+        compare_widget.deleteLater()
+        self.add_message(column.content, False)
+        self.db.save_message(self.current_conversation_id, "assistant", column.content)
+        if self.current_conversation_id not in self.conversations:
+            self.conversations[self.current_conversation_id] = []
+        self.conversations[self.current_conversation_id].append({"role": "assistant", "content": column.content})
+    
     def switch_conversation(self, item):
         conv_id = item.data(Qt.ItemDataRole.UserRole)
         self.current_conversation_id = conv_id
@@ -613,6 +1262,30 @@ class AIAssistant(QMainWindow):
             
             self.ai.api_key = api_key
             self.db.save_setting("api_key", api_key)
+    
+    def toggle_profiler(self):
+        if not self.profiler.active:
+            self.profiler.start()
+            self.profile_btn.setChecked(True)
+            return
+        
+        self.profile_btn.setChecked(False)
+        try:
+            path = self.profiler.stop()
+        except OSError as e:
+            QMessageBox.warning(self, "Профилирование", f"Не удалось сохранить отчет:\n{str(e)}")
+            return
+        QMessageBox.information(self, "Профилирование", f"Отчет сохранен:\n{os.path.abspath(path)}")
+    
+    def closeEvent(self, event):
+        if self.profiler.active:
+            try:
+                self.profiler.stop()
+            except OSError as e:
+                QMessageBox.warning(self, "Профилирование", f"Не удалось сохранить отчет:\n{str(e)}")
+        if self.watchdog:
+            self.watchdog.stop()
+        super().closeEvent(event)
 
 # ==================== SETTINGS DIALOG ====================
 class SettingsDialog(QDialog):
@@ -733,6 +1406,122 @@ class SettingsDialog(QDialog):
     def api_key(self):
         return self.api_input.text().strip()
 
+# ==================== COMPARE ====================
+class CompareColumn(QFrame):
+    """Колонка с потоковым ответом одной модели в режиме сравнения"""
+    def __init__(self, model_name, parent=None):
+        super().__init__(parent)
+        self.model_name = model_name
+        self.content = ""
+        self.setStyleSheet("""
+            QFrame {
+                background: #f8f9fa; border-radius: 12px; border: 1px solid #e9ecef;
+            }
+        """)
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(15, 12, 15, 12)
+        
+        name = QLabel(model_name)
+        name.setStyleSheet("color: #444; font-weight: bold; border: none;")
+        
+        self.text = QLabel("Генерация ответа...")
+        self.text.setWordWrap(True)
+        self.text.setAlignment(Qt.AlignmentFlag.AlignTop)
+        self.text.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        self.text.setStyleSheet("border: none;")
+        
+        self.stats = QLabel("")
+        self.stats.setStyleSheet("color: #6c757d; font-size: 12px; border: none;")
+        
+        self.keep_btn = QPushButton("Оставить этот ответ")
+        self.keep_btn.setEnabled(False)
+        self.keep_btn.setStyleSheet("""
+            QPushButton {
+                background: #667eea; color: white; border: none; border-radius: 6px;
+                padding: 8px; font-weight: 500;
+            }
+            QPushButton:hover { background: #5a6bc0; }
+            QPushButton:disabled { background: #ced4da; }
+        """)
+        
+        layout.addWidget(name)
+        layout.addWidget(self.text, 1)
+        layout.addWidget(self.stats)
+        layout.addWidget(self.keep_btn)
+    
+    def append_text(self, delta):
+        self.content += delta
+        self.text.setText(self.content)
+    
+    def finish(self, stats, error=""):
+        self.stats.setText(stats)
+        if error:
+            self.text.setText(self.content + ("\n\n" if self.content else "") + error)
+        elif not self.content:
+            self.text.setText("Пустой ответ.")
+        self.keep_btn.setEnabled(bool(self.content) and not error)
+
+class CompareDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Сравнение моделей")
+        self.setFixedWidth(400)
+        self.setModal(True)
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(25, 20, 25, 20)
+        layout.setSpacing(12)
+        
+        label = QLabel("Выберите модели для сравнения:")
+        label.setStyleSheet("color: #495057; font-weight: 500; font-size: 13px;")
+        layout.addWidget(label)
+        
+        self.checkboxes = []
+        for model_name in AIEngine.MODELS:
+            checkbox = QCheckBox(model_name)
+            checkbox.setChecked(True)
+            self.checkboxes.append(checkbox)
+            layout.addWidget(checkbox)
+        
+        button_layout = QHBoxLayout()
+        
+        start_btn = QPushButton("Сравнить")
+        start_btn.setFixedHeight(40)
+        start_btn.setMinimumWidth(120)
+        start_btn.setStyleSheet("""
+            QPushButton {
+                background: #667eea; color: white; border: none; border-radius: 8px;
+                font-weight: 600; font-size: 13px;
+            }
+            QPushButton:hover { background: #5a6bc0; }
+        """)
+        start_btn.clicked.connect(self.accept)
+        
+        cancel_btn = QPushButton("Отмена")
+        cancel_btn.setFixedHeight(40)
+        cancel_btn.setMinimumWidth(120)
+        cancel_btn.setStyleSheet("""
+            QPushButton {
+                background: #6c757d; color: white; border: none; border-radius: 8px;
+                font-weight: 600; font-size: 13px;
+            }
+            QPushButton:hover { background: #5a6268; }
+        """)
+        cancel_btn.clicked.connect(self.reject)
+        
+        button_layout.addStretch()
+        button_layout.addWidget(start_btn)
+        button_layout.addSpacing(10)
+        button_layout.addWidget(cancel_btn)
+        
+        layout.addSpacing(10)
+        layout.addLayout(button_layout)
+    
+    @property
+    def selected_models(self):
+        return [c.text() for c in self.checkboxes if c.isChecked()]
+
 # ==================== MAIN ====================
 def main():
     app = QApplication(sys.argv)